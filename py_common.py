@@ -3,65 +3,135 @@
 # Contains common functions necessary for various python testcase scripts.
 #
 
-import os, re, csv, datetime, subprocess, glob, sys, time, shutil
+import os, re, csv, datetime, subprocess, glob, sys, time, shutil, itertools, shlex, collections, io, locale, concurrent.futures
+from typing import NamedTuple
 
 def is_generated_file(fullfilepath):
 	"""
 	Determines if the first line of a file contains the autogenerated signature string.
 	"""
-	with open(fullfilepath, 'r') as f:
-		firstline = f.readline()
-		if firstline.strip() == get_engine_signature():
-			return True
-	return False
+	signature_length = len(_ENGINE_SIGNATURE_BYTES)
 
-def find_files_in_dir(directory, regex, silent=True):
+	# only the signature and the character after it need to be read
+	with open(fullfilepath, 'rb') as f:
+		start = f.read(signature_length + 1)
+
+	return start[:signature_length] == _ENGINE_SIGNATURE_BYTES and \
+		start[signature_length:] in (b'', b'\n', b'\r')
+
+def _compile_regex(regex):
+	"""
+	Returns a compiled, case-insensitive pattern for regex.  Patterns that
+	are already compiled are returned unchanged.
+	"""
+	if hasattr(regex, 'search'):
+		return regex
+	return re.compile(regex, re.IGNORECASE)
+
+def _iwalk(top):
+	"""
+	Yields a DirEntry for every file and directory below top (recursively).
+	Uses an explicit stack of os.scandir calls so that the file type comes from
+	the directory listing instead of a stat per entry.
+
+	Like os.walk (top-down), each directory's entries are yielded in listing
+	order before its subdirectories are walked, and the subdirectories are
+	walked in listing order.  Symbolic links to directories are yielded but
+	not followed, and directories that cannot be listed (including a missing
+	top) are skipped.
+	"""
+	stack = [top]
+	while stack:
+		try:
+			it = os.scandir(stack.pop())
+		except OSError:
+			continue
+		subdirs = []
+		with it:
+			for entry in it:
+				try:
+					if entry.is_dir(follow_symlinks=False):
+						subdirs.append(entry.path)
+				except OSError:
+					pass
+				yield entry
+		# reversed so that the first subdirectory is popped first
+		stack.extend(reversed(subdirs))
+
+def _is_dir(entry):
+	"""
+	Returns True if a DirEntry is a directory or a symbolic link to one.
+	Anything else, including a broken symbolic link, counts as a file, the
+	same way os.walk sorts entries into dirs and files.
+	"""
+	try:
+		return entry.is_dir()
+	except OSError:
+		return False
+
+def iter_files_in_dir(directory, regex, silent=True, endswith=None):
+	"""
+	Generator version of find_files_in_dir.  Matching files are yielded as the
+	directory tree is walked, so callers can start working before the walk is
+	complete.
+
+	The walk starts from the real path of directory, so the yielded paths are
+	absolute and the caller may change the working directory while iterating.
+	Paths below that are not resolved any further.
+
+	endswith is an optional tuple of lower case suffixes (such as the one from
+	get_testcase_extensions()).  File names without one of those suffixes are
+	skipped before the regex is tried.
+	"""
+	pattern = _compile_regex(regex)
+	for entry in _iwalk(os.path.realpath(directory)):
+		if _is_dir(entry):
+			continue
+		name = entry.name
+		if (endswith == None or name.lower().endswith(endswith)) and pattern.search(name) != None:
+			yield entry.path
+		else:
+			if not silent:
+				print("Skipped file (did not match regex): ", name)
+
+def find_files_in_dir(directory, regex, silent=True, endswith=None):
 	"""
 	Finds files (non-directories) that match a regex in a certain directory.  (recursively, case-insensitive)
 	Can pass an optional argument of silent=False to print filenames that did not match the regex.
+	The regex may be a string or an already compiled pattern.
+	Can pass an optional tuple of file name suffixes to check before the regex (see iter_files_in_dir).
 	"""
-	matching_files = []
-	for root, dirs, files in os.walk(directory):
-		for name in files:
-			result = re.search(regex, name, re.IGNORECASE)
-			if result != None:
-				matching_files.append(os.path.realpath(os.path.join(root, name)))
-			else:
-				if not silent:
-					print("Skipped file (did not match regex): ", name)
+	return list(iter_files_in_dir(directory, regex, silent, endswith))
 
-	return matching_files
+def iter_directories_in_dir(directory, regex, silent=True):
+	"""
+	Generator version of find_directories_in_dir.
+	"""
+	pattern = _compile_regex(regex)
+	for entry in _iwalk(os.path.realpath(directory)):
+		if not _is_dir(entry):
+			continue
+		if pattern.search(entry.name) != None:
+			yield entry.path
+		else:
+			if not silent:
+				print("Skipped dir (did not match regex): ", entry.name)
 
 def find_directories_in_dir(directory, regex, silent=True):
 	"""
 	Finds directories that match a regex in a certain directory (recursively, case-insensitive)
 	Can pass an optional argument of silent=False to print filenames that did not match the regex.
+	The regex may be a string or an already compiled pattern.
 	"""
-	matching_directories = []
-	for root, dirs, files in os.walk(directory):
-		for name in dirs:
-			result = re.search(regex, name, re.IGNORECASE)
-			if result != None:
-				matching_directories.append(os.path.realpath(os.path.join(root, name)))
-			else:
-				if not silent:
-					print("Skipped dir (did not match regex): ", name)
-
-	return matching_directories
+	return list(iter_directories_in_dir(directory, regex, silent))
 
 def find_all_files_in_dir_nr(directory):
 	"""
 	Finds all files (non-directories) in a directory.  This function is not recursive.
 	"""
-	files = os.listdir(directory)
-
-	# append base dir
-	files = list(map(lambda x: os.path.join(directory, x), files))
-
-	# make sure each path is a file (and not a directory)
-	files = list(filter(lambda x: os.path.isfile(x), files))
-
-	return files
+	# the file type comes from the directory listing, so no stat is needed per entry
+	with os.scandir(directory) as it:
+		return [entry.path for entry in it if entry.is_file()]
 
 def find_testcase_functional_variants_in_dir(dir):
 	"""
@@ -71,52 +141,65 @@ def find_testcase_functional_variants_in_dir(dir):
 	"""
 	
 	func_vars = []
-	
-	# filter the list of test cases to the baseline test cases so that we can
-	# iterate over this list without worrying about duplicate functional variants
-	baseline_testcases = find_files_in_dir(dir, get_baseline_functional_variant_regex())
-	
-	for btc in baseline_testcases:
-		btc_file_name = os.path.basename(btc)
-		result = re.search(get_testcase_filename_regex(), btc_file_name, re.IGNORECASE)
-
+	seen_func_vars = set()
+	
+	# only look at the baseline test cases so that we can iterate over the tree
+	# without worrying about duplicate functional variants; the same pattern
+	# captures the functional variant name so each file is matched just once
+	for entry in _iwalk(dir):
+		if _is_dir(entry) or not entry.name.lower().endswith(_TESTCASE_EXTENSIONS):
+			continue
+		if _is_cwe580_bad_testcase(entry.name):
+			continue
+		result = _BASELINE_TESTCASE_FILENAME_RE.match(entry.name)
 		if result != None:
-			func_vars.append(result.group('functional_variant_name'))
-		else:
-			print_with_timestamp('Could not determine the functional variant in ' + btc_file_name)
-			exit(1)
+			func_var = result.group('functional_variant_name')
+			if func_var not in seen_func_vars:
+				seen_func_vars.add(func_var)
+				func_vars.append(func_var)
+		elif _BASELINE_FUNCTIONAL_VARIANT_RE.search(entry.name) != None:
+			# a baseline file whose name does not follow the test case naming scheme
+			print_with_timestamp("WARNING: Could not determine the functional variant in " + entry.name + " (file skipped)")
 
 	return func_vars
 	
+def _read_text_file(file):
+	"""
+	Reads a whole file with a single read and decodes it in one pass, using the
+	same encoding and newline translation as opening the file in text mode.
+	Returns None if the file cannot be decoded.
+	"""
+	with open(file, 'rb') as f:
+		data = f.read()
+
+	try:
+		content = data.decode(locale.getpreferredencoding(False))
+	except UnicodeDecodeError as error:
+		print("\n\n")
+		print(error)
+		print("Weird char in ", file)
+		print("\n")
+		return None
+
+	if '\r' in content:
+		content = content.replace('\r\n', '\n').replace('\r', '\n')
+
+	return content
+
 def open_file_and_get_contents(file):
 	"""
 	Returns the entire contents of a file as one large string.
 	"""
-	with open(file, 'r') as f:
-		try:
-			content = f.read()
-			return content
-		except UnicodeDecodeError as error:
-			print("\n\n")
-			print(error)
-			print("Weird char in ", file)
-			print("\n")
-			return None;
+	return _read_text_file(file)
 
 def open_file_and_get_lines(file):
 	"""
 	Returns the file as a list of lines
 	"""
-	with open(file, 'r') as f:
-		try:
-			lines = f.readlines()
-			return lines
-		except UnicodeDecodeError as error:
-			print("\n\n")
-			print(error)
-			print("Weird char in ", file)
-			print("\n")
-			return None;
+	content = _read_text_file(file)
+	if content == None:
+		return None
+	return io.StringIO(content, newline='\n').readlines()
 
 def write_file(filename, contents):
 	"""
@@ -129,13 +212,8 @@ def read_csv(filename):
 	"""
 	Reads a csv.
 	"""
-	raw_records = []
-	with open(filename, 'r') as f:
-		reader = csv.reader(f, dialect='excel')
-		for row in reader:
-			raw_records.append(row)
-	
-	return raw_records
+	with open(filename, 'r', newline='') as f:
+		return list(csv.reader(f, dialect='excel'))
 
 def read_csv_with_header(filename):
 	"""
@@ -153,8 +231,7 @@ def write_csv(filename, records):
 	"""
 	with open(filename, 'w', newline='') as f:
 		writer = csv.writer(f, dialect='excel')
-		for r in records:
-			writer.writerow(r)
+		writer.writerows(records)
 
 def transform_csv(input_file, output_file, header_fx=None, row_fx=None):
 	"""
@@ -221,6 +298,7 @@ def get_testcase_filename_regex():
 
 	If you change this regex, update the C# common library regex.
 	If you change this regex, update the primary testcase filename regex.
+	If you change this regex, update _BASELINE_TESTCASE_FILENAME_RE.
 	"""
 
 	return "^cwe" + \
@@ -236,6 +314,15 @@ def get_testcase_filename_regex():
 		"\." + \
 		"(?P<extension>c|cpp|java|h)$"
 
+def get_testcase_extensions():
+	"""
+	The file name extensions of test case files (the extensions in the test
+	case filename regex).  Can be passed to find_files_in_dir as endswith.
+	"""
+	return ('.c', '.cpp', '.java', '.h')
+
+_TESTCASE_EXTENSIONS = get_testcase_extensions()
+
 def get_primary_testcase_filename_regex():
 	"""
 	This regex matches only primary test case files.
@@ -272,10 +359,31 @@ def get_baseline_functional_variant_regex():
 
 	The "(?!CWE580.*01_bad.java)" prevents getting the _bad file for 
 	CWE580 since it also has an "a" file.
+
+	If you change this regex, update _BASELINE_TESTCASE_FILENAME_RE.
 	"""
 	
 	return "^(?!CWE580.*01_bad.java)CWE\d+.*_01((a)|(_?bad)|)\.(c|cpp|java)?$"
 
+def _is_cwe580_bad_testcase(file_name):
+	"""
+	Returns True for the CWE580 flow variant 01 _bad file.  CWE580 also has an
+	"a" file for that flow variant, so the _bad file is neither the primary
+	nor the baseline test case file.  Takes a file name, not a path.
+
+	The compiled patterns below leave out the "(?!CWE580.*01_bad.java)"
+	lookahead of the regex getters and use this check instead.
+	"""
+	file_name = file_name.lower()
+	return file_name.startswith("cwe580") and file_name.endswith("01_bad.java")
+
+def is_primary_testcase_file(file_name):
+	"""
+	Returns True if a file name (not a path) matches the primary test case
+	filename regex.
+	"""
+	return _PRIMARY_TESTCASE_FILENAME_RE.search(file_name) != None and not _is_cwe580_bad_testcase(file_name)
+
 def get_functionname_c_regex():
 	"""
 	Used to get the "simple" function name for c functions.
@@ -288,29 +396,55 @@ def get_cwe_id_regex():
 	"""
 	return "(CWE\d+)_"
 	
+# Compiled once at import so the per-file matching in the helpers below
+# does not go back through the re module cache on every call
+_TESTCASE_FILENAME_RE = re.compile(get_testcase_filename_regex(), re.IGNORECASE)
+_CWE580_BAD_LOOKAHEAD = "(?!CWE580.*01_bad.java)"
+_PRIMARY_TESTCASE_FILENAME_RE = re.compile(get_primary_testcase_filename_regex().replace(_CWE580_BAD_LOOKAHEAD, "", 1), re.IGNORECASE)
+_BASELINE_FUNCTIONAL_VARIANT_RE = re.compile(get_baseline_functional_variant_regex().replace(_CWE580_BAD_LOOKAHEAD, "", 1), re.IGNORECASE)
+# Baseline (flow variant 01) test case files, capturing the functional variant name.
+# If you change this regex, update the baseline functional variant regex.
+# If you change this regex, update the testcase filename regex.
+_BASELINE_TESTCASE_FILENAME_RE = re.compile(r"^cwe" + \
+	r"(?P<cwe_number>\d+)" + \
+	r"_" + \
+	r"(?P<cwe_name>.*)" + \
+	r"__" + \
+	r"(?P<functional_variant_name>.*)" + \
+	r"_01" + \
+	r"(a|_?bad)?" + \
+	r"\." + \
+	r"(c|cpp|java)$", re.IGNORECASE)
+_FUNCTIONNAME_C_RE = re.compile(get_functionname_c_regex(), re.IGNORECASE)
+_CWE_ID_RE = re.compile(get_cwe_id_regex())
+
 def get_java_testcase_lib():
 	"""
 	Used to get the path to the Java test case lib directory
 	"""
 	return "..\\..\\..\\lib"
+
+_JAVA_TESTCASE_LIB_SPLIT = "..\\" + get_java_testcase_lib()
 	
 def get_java_testcase_lib_split():
 	"""
 	Used to get the path to the Java test case lib directory from a split directory
 	"""
-	return "..\\" + get_java_testcase_lib()
+	return _JAVA_TESTCASE_LIB_SPLIT
 	
 def get_c_and_cpp_testcasesupport_dir():
 	"""
 	Used to get the path to the C/C++ test case support directory
 	"""
 	return "..\\..\\testcasesupport"
+
+_C_AND_CPP_TESTCASESUPPORT_DIR_SPLIT = "..\\" + get_c_and_cpp_testcasesupport_dir()
 	
 def get_c_and_cpp_testcasesupport_dir_split():
 	"""
 	Used to get the path to the C/C++ test case support directory from a split directory
 	"""
-	return "..\\" + get_c_and_cpp_testcasesupport_dir()
+	return _C_AND_CPP_TESTCASESUPPORT_DIR_SPLIT
 	
 def get_testcase_subdirectory_regex():
 	"""
@@ -333,6 +467,8 @@ def get_engine_signature():
 	manually-genenerated test cases.
 	"""
 	return "/* TEMPLATE GENERATED TESTCASE FILE"
+
+_ENGINE_SIGNATURE_BYTES = get_engine_signature().encode()
 	
 def get_java_main_comment():
 	"""
@@ -362,71 +498,132 @@ def map_weakness_classes(file):
 	"""
 	header, records = read_csv_with_header(file)
 
-	dict = {}
+	cwe_index = header.index("CWEID")
+	wclass_index = header.index("Weakness Class")
+
+	wclasses = collections.defaultdict(list)
 
 	for record in records:
-		cwe = record[header.index("CWEID")]
-		wclass = record[header.index("Weakness Class")]
-		if cwe in dict.keys():
-			dict[cwe].append(wclass)
+		cwe = record[cwe_index]
+		cwe_wclasses = wclasses[cwe]
+		cwe_wclasses.append(record[wclass_index])
+		if len(cwe_wclasses) > 1:
 			# may want to error here instead
 			print_with_timestamp("WARNING: CWE \"" + cwe + "\" is assigned to more than 1 weakness class.")
-		else:
-			dict[cwe] = [wclass]
 
-	return dict
+	return dict(wclasses)
 
 def print_with_timestamp(contents):
 	"""
 	Print a string with the timestamp at the beginning of the line.
 	"""
-	print("[" + time.ctime(None) + "] " + contents)
+	print(f"[{time.ctime()}] {contents}")
 	
-def run_commands(commands, use_shell=False):
+def _run_command(command, use_shell, cwd):
 	"""
-	Runs a command as if it were run in the command prompt.  If you need to use commands such as
-	"cd, dir, etc", set use_shell to True.
+	Runs a single command (an argument list or, with use_shell, a string) in
+	the cwd directory and prints how long it took.
 	"""
-	command = " && ".join(commands)
+	if isinstance(command, str):
+		command_str = command
+	elif os.name == 'nt':
+		command_str = subprocess.list2cmdline(command)
+	else:
+		command_str = shlex.join(command)
+
+	# the shell only understands a single command line
+	if use_shell:
+		command = command_str
 	
 	# Not using print_with_timestamp() here since we want to capture the time for the time diff
 	time_started = time.time()
-	print("[" + time.ctime(time_started) + "] Started command: \"" + command + "\"")
+	print(f"[{time.ctime(time_started)}] Started command: \"{command_str}\"")
 	sys.stdout.flush()
 	
-	subprocess.check_call(command, shell=use_shell, stderr=sys.stderr, stdout=sys.stdout)
+	subprocess.check_call(command, shell=use_shell, cwd=cwd, stderr=sys.stderr, stdout=sys.stdout)
 	
 	# Not using print_with_timestamp() here since we want to capture the time for the time diff
 	time_ended = time.time()
-	print("[" + time.ctime(time_ended) + "] Finished command: \"" + command + "\"")
+	print(f"[{time.ctime(time_ended)}] Finished command: \"{command_str}\"")
 	
 	elapsed_seconds = time_ended-time_started
-	print_with_timestamp("Command \"" + command + "\" took " + str(elapsed_seconds) + " seconds to complete.")
+	print_with_timestamp(f"Command \"{command_str}\" took {elapsed_seconds} seconds to complete.")
+
+def run_commands(commands, use_shell=False, cwd=None):
+	"""
+	Runs each command in order, stopping at the first one that fails.  Each
+	command is a list of arguments, for example [["ant", "compile"], ["ant", "jar"]].
+
+	Set use_shell to True if a command needs to be found by the shell, such as a
+	batch file on Windows.  If you need to use commands such as "cd, dir, etc"
+	or chain commands together, use run_shell_pipeline.
 
-def run_analysis(test_case_path, build_file_regex, run_analysis_fx):
+	The commands are run in the cwd directory (default: the current directory).
+	"""
+	for command in commands:
+		_run_command(command, use_shell, cwd)
+
+def run_shell_pipeline(command, cwd=None):
+	"""
+	Runs a command string through the shell as if it were run in the command
+	prompt, for example "cd build && ant".
+	"""
+	_run_command(command, True, cwd)
+
+def _run_analysis_worker(run_analysis_fx, file):
+	"""
+	Runs one file for run_analysis.
+	"""
+	run_analysis_fx(os.path.basename(file), cwd=os.path.dirname(file))
+
+def run_analysis(test_case_path, build_file_regex, run_analysis_fx, max_workers=None):
 	"""
 	Helper method to run an analysis using a tool.  
 	Takes a test case path, build file regex and a function pointer.
-	"""
 
-	time_started = time.time()
+	The function pointer is called as run_analysis_fx(file, cwd=dir) where file
+	is the name of the matching file and dir is the directory containing it.
+	The working directory is not changed, so run_analysis_fx should pass cwd on
+	to run_commands.
 
-	# find all the files
-	files = find_files_in_dir(test_case_path, build_file_regex)
-	
-	# run all the files using the function pointer
-	for file in files:
+	The files are run in parallel in a pool of max_workers processes (one per
+	CPU by default).  run_analysis_fx must be defined at module level so that
+	it can be sent to the worker processes.  Set max_workers to 1 to run the
+	files one at a time in this process instead.
 
-		# change into directory with the file
-		dir = os.path.dirname(file)
-		os.chdir(dir)
+	The first file that raises an exception stops the analysis: files that
+	have not started yet are cancelled and the exception is re-raised.
+	"""
+
+	time_started = time.time()
 
-		# run the the file
-		file = os.path.basename(file)
-		run_analysis_fx(file)
+	files = iter_files_in_dir(test_case_path, build_file_regex)
 
-		# return to original working directory
-		os.chdir(sys.path[0])
+	if max_workers == 1:
+		# run all the files using the function pointer as they are found
+		for file in files:
+			_run_analysis_worker(run_analysis_fx, file)
+	else:
+		if max_workers == None:
+			max_workers = os.cpu_count() or 1
+
+		with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+			# only submit a file when a worker is free, so that a failure
+			# leaves no queued files behind that would still be run
+			futures = set()
+			try:
+				for file in files:
+					if len(futures) >= max_workers:
+						done, futures = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+						for future in done:
+							future.result()
+					futures.add(executor.submit(_run_analysis_worker, run_analysis_fx, file))
+
+				for future in concurrent.futures.as_completed(futures):
+					future.result()
+			except BaseException:
+				executor.shutdown(cancel_futures=True)
+				raise
 	
 	time_ended = time.time()
 
@@ -436,49 +633,45 @@ def run_analysis(test_case_path, build_file_regex, run_analysis_fx):
 	elapsed_seconds = time_ended-time_started
 	print_with_timestamp("Elapsed time: " + convertSecondsToDHMS(elapsed_seconds))
 
+class TestcaseParts(NamedTuple):
+	"""
+	The parts of a test case file name, as returned by break_up_filename.
+	break_up_filename used to return a dict with these field names as keys;
+	use parts.testcase_cwe_number instead of parts["testcase_cwe_number"],
+	or parts._asdict() where a dict is still needed.
+	"""
+	testcase_cwe_number: str
+	testcase_cwe_name: str
+	testcase_function_variant: str
+	testcase_flow_variant: str
+	testcase_subfile_id: str
+	testcase_language: str
+
+_BLANK_TESTCASE_PARTS = TestcaseParts('', '', '', '', '', '')
+
 def break_up_filename(file_name):
 	"""
 	Looks for various parts of the filename to place into the new columns.
+	Returns a TestcaseParts.
 	"""
 
-	cwe_num = ''
-	cwe_name = ''
-	fx_var = ''
-	flow_var = ''
-	subfile = ''
-	lang = ''
-
-	result = re.search(get_testcase_filename_regex(), file_name, re.IGNORECASE)
+	result = _TESTCASE_FILENAME_RE.search(file_name)
 
 	if result == None:
 
 		# use blank values
 		print_with_timestamp("WARNING: file \"" + file_name + "\" is not going to be parsed into parts! (blank values will be used)")
-	else:
-		# its a normal testcase file
-		cwe_num = result.group('cwe_number')
-		cwe_name = result.group('cwe_name')
-		fx_var = result.group('functional_variant_name')
-		flow_var = result.group('flow_variant_id')
-		subfile = result.group('subfile_id')
-		lang = result.group('extension')
-
-	parts = {}
-	parts["testcase_cwe_number"] = cwe_num
-	parts["testcase_cwe_name"] = cwe_name
-	parts["testcase_function_variant"] = fx_var
-	parts["testcase_flow_variant"] = flow_var
-	parts["testcase_subfile_id"] = subfile
-	parts["testcase_language"] = lang
-
-	return parts
+		return _BLANK_TESTCASE_PARTS
+
+	# its a normal testcase file
+	return TestcaseParts(*result.group('cwe_number', 'cwe_name', 'functional_variant_name', 'flow_variant_id', 'subfile_id', 'extension'))
 
 def break_up_cpp_function_name(function_name):
 	"""
 	Looks for various parts of the function name to place into the simplified function name
 	"""
 
-	result = re.search(get_functionname_c_regex(), function_name, re.IGNORECASE)
+	result = _FUNCTIONNAME_C_RE.search(function_name)
 
 	if result == None:
 		# Just use the original
@@ -489,20 +682,25 @@ def break_up_cpp_function_name(function_name):
 
 def concatenate_csvs(input_directory, output_file):
 	"""
-	Combines multiple CSV files into a single CSV file.
+	Combines multiple CSV files into a single CSV file.  The input files are
+	streamed so only one row is held in memory at a time.
 	"""
 	
-	with open(output_file, 'w', newline='') as f:
-		writer = csv.writer(f, dialect='excel')
+	with open(output_file, 'w', newline='') as fo:
+		writer = csv.writer(fo, dialect='excel')
 		need_header = True
 		
-		for file in find_files_in_dir(input_directory, ".*?\.csv$"):
-			header, records = read_csv_with_header(file)
-			if need_header:
-				writer.writerow(header)
-				need_header = False
-			for record in records:
-				writer.writerow(record)
+		for file in iter_files_in_dir(input_directory, ".*?\.csv$"):
+			with open(file, 'r', newline='') as fi:
+				reader = csv.reader(fi, dialect='excel')
+				header = next(reader, None)
+				if header == None:
+					# empty file
+					continue
+				if need_header:
+					writer.writerow(header)
+					need_header = False
+				writer.writerows(reader)
 
 def generate_unique_finding_ids(input_csv, output_csv):
 	"""
@@ -530,21 +728,36 @@ def generate_unique_finding_ids(input_csv, output_csv):
 				writer.writerow(row)
 				unique_id = unique_id + 1
 
-unique_id_count = 1
-def add_unique_finding_ids(orig_header, new_header, row, data):
+def make_add_unique_finding_ids(start=1):
 	"""
-	Modifies CSV row so that each number in the finding_id column is unique
-	Call this from transform_csv
-	
-	For example: transform_csv(input_file, output_file, header_fx=None, row_fx=add_unique_finding_id)
+	Returns a row function that modifies each CSV row so that each number in the
+	finding_id column is unique.  Every returned function has its own counter,
+	starting at start.  Call this from transform_csv
+
+	For example:
+		transform_csv(input_file, output_file, row_fx=make_add_unique_finding_ids())
+
+	The finding_id column is looked up in the original header on the first
+	row of each CSV and reused for the rest of its rows.
 	"""
-	global unique_id_count
-	finding_id_index = orig_header.index('finding_id')
-	row[finding_id_index] = unique_id_count
-	
-	unique_id_count += 1
-	
-	return row
+	counter = itertools.count(start)
+	finding_id_header = None
+	finding_id_index = None
+
+	def add_unique_finding_ids(orig_header, new_header, row, data):
+		nonlocal finding_id_header, finding_id_index
+		# transform_csv passes the same header list for every row of a CSV
+		if orig_header is not finding_id_header:
+			finding_id_header = orig_header
+			finding_id_index = orig_header.index('finding_id')
+		row[finding_id_index] = next(counter)
+		return row
+
+	return add_unique_finding_ids
+
+# Shares a single counter between all of its callers, for scripts that use
+# transform_csv(input_file, output_file, header_fx=None, row_fx=add_unique_finding_ids)
+add_unique_finding_ids = make_add_unique_finding_ids()
 	
 def encode_language(input_lang):
 	"""
@@ -578,21 +791,23 @@ def move_testcase_to_split_directories(dir, functional_variants, testcase_files,
 	is_subdir_needed = True
 	func_var_dir = ""
 	
+	# group the test cases by functional variant in a single pass
+	# (functional variant names are compared case-insensitively)
+	testcase_files_by_func_var = collections.defaultdict(list)
+	for testcase_file in testcase_files:
+		result = _TESTCASE_FILENAME_RE.search(os.path.basename(testcase_file))
+		if result != None:
+			testcase_files_by_func_var[result.group('functional_variant_name').lower()].append(testcase_file)
+	
 	for func_var in functional_variants:
-		# filter the list of test cases for this functional variant
-		func_var_regex = "__" + func_var + "_\d\d"
-		filter_regex = re.compile(func_var_regex, re.IGNORECASE)
-		func_var_testcase_files = [f for f in testcase_files if filter_regex.search(f)]
+		func_var_testcase_files = testcase_files_by_func_var.get(func_var.lower(), [])
 		func_var_testcase_files_count = len(func_var_testcase_files)
 
 		if ((func_var_testcase_files_count + number_of_files_in_subdir) > file_count_limit):
 			is_subdir_needed = True
 	
 		if is_subdir_needed == True:
-			if subdir_count < 10:
-				func_var_dir = os.path.join(dir, 's' + '0' + str(subdir_count))
-			else: 
-				func_var_dir = os.path.join(dir, 's' + str(subdir_count))
+			func_var_dir = os.path.join(dir, f"s{subdir_count:02d}")
 			os.mkdir(func_var_dir)
 			subdir_count = subdir_count + 1
 			is_subdir_needed = False
@@ -600,12 +815,11 @@ def move_testcase_to_split_directories(dir, functional_variants, testcase_files,
 		else:
 			number_of_files_in_subdir = number_of_files_in_subdir + func_var_testcase_files_count
 		
-		# Copy the files for this functional variant to the new directory
-		# and remove the file from the CWE root directory
+		# Move the files for this functional variant to the new directory
+		# (a rename when both are on the same file system)
 		print_with_timestamp("Moving the test cases for the following functional variant \"" + func_var + "\" to subdirecory \"" + func_var_dir + "\"")
 		for testcase_file in func_var_testcase_files:
-			shutil.copy(testcase_file, func_var_dir)
-			os.unlink(testcase_file)
+			shutil.move(testcase_file, func_var_dir)
 			
 def create_or_clean_directory(dir):
 	"""
@@ -635,12 +849,12 @@ def extract_cwe_id_from_path(path):
 	"""
 	cwe_id = ""
 	if os.path.basename(path).startswith('CWE'):
-		cwe_id = re.search(get_cwe_id_regex(), os.path.basename(path)).group(1)
+		cwe_id = _CWE_ID_RE.search(os.path.basename(path)).group(1)
 	# if the basename does not start with 'CWE' then we are in a sub-directory
 	# and the sub-directory name is "s" plus a number (s01, s02, etc.) so we append this string
 	# to the end of the CWE id to make it a unique value
 	else:
-		cwe_id = re.search(get_cwe_id_regex(), path).group(1)
+		cwe_id = _CWE_ID_RE.search(path).group(1)
 		sub_dir = os.path.basename(path)
 		cwe_id = cwe_id + '_' + sub_dir
 		
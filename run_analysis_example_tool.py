@@ -16,43 +16,42 @@ sys.path.append("..")
 
 import py_common
 
-def run_example_tool(build_xml_file):
+def run_example_tool(build_xml_file, cwd):
 
 	"""
 	This method is called from the run_analysis method.  It is called for
 	each matching file.  Files are matched against the glob expression
 	specified in main.
 
-	When this method is called, the script will have changed to the directory 
-	where the build.xml file exists.
+	cwd is the directory where the build.xml file exists.  The commands
+	need to be run in that directory.
 	"""
 	
 	# In order to run a source code analysis tool, build appropriate command
 	# line(s) as shown in the commented out example below
 	"""
 	# retrieve the CWE # from the parent directory name
-	path = os.getcwd()
-	cwe_id = re.search("(CWE\d+)_", os.path.basename(path)).group(1)
+	cwe_id = re.search("(CWE\d+)_", os.path.basename(cwd)).group(1)
 
 	build_name = "toolname.java." + py_common.get_timestamp() + "." + cwe_id
 
-	command1 = "mytool --build " + build_name + " --option1 --option2 " + build_xml_file
+	command1 = ["mytool", "--build", build_name, "--option1", "--option2", build_xml_file]
 
-	py_common.print_with_timestamp("Running " + command1)
-	py_common.run_commands([command1], True)
+	py_common.print_with_timestamp("Running " + " ".join(command1))
+	py_common.run_commands([command1], True, cwd)
 
-	command2 = "mytool --analyze " + build_name + " --output " + build_name + ".xml"
+	command2 = ["mytool", "--analyze", build_name, "--output", build_name + ".xml"]
 
-	py_common.print_with_timestamp("Running " + command2)
-	py_common.run_commands([command2], True)
+	py_common.print_with_timestamp("Running " + " ".join(command2))
+	py_common.run_commands([command2], True, cwd)
 	"""
   
 	# The code below will just run ant to compile the test cases without using a tool
 	# Remove or comment out this code when modifying this file to use an analysis tool
-	command = "ant"
+	command = ["ant"]
 
-	py_common.print_with_timestamp("Running " + command)
-	py_common.run_commands([command], True)
+	py_common.print_with_timestamp("Running " + " ".join(command))
+	py_common.run_commands([command], True, cwd)
 
 if __name__ == '__main__':
 
@@ -0,0 +1,45 @@
+#
+# Tests for py_common.py.  Run from the top level directory with:
+#   python -m unittest discover tests
+#
+
+import os, sys, shutil, tempfile, unittest
+
+# add parent directory to search path so we can use py_common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import py_common
+
+class FindInDirTest(unittest.TestCase):
+
+	def test_missing_directory(self):
+		missing_dir = os.path.join(tempfile.gettempdir(), "py_common_missing_dir")
+		self.assertEqual(py_common.find_files_in_dir(missing_dir, ".*"), [])
+		self.assertEqual(py_common.find_directories_in_dir(missing_dir, ".*"), [])
+
+	def test_same_order_as_os_walk(self):
+		top = os.path.realpath(tempfile.mkdtemp())
+		try:
+			for sub_dir in ["s02", "s01", "s03", os.path.join("s01", "b"), os.path.join("s01", "a")]:
+				os.mkdir(os.path.join(top, sub_dir))
+				for name in ["z.txt", "a.txt"]:
+					open(os.path.join(top, sub_dir, name), 'w').close()
+			open(os.path.join(top, "top.txt"), 'w').close()
+			if hasattr(os, "symlink"):
+				os.symlink(os.path.join(top, "missing"), os.path.join(top, "broken_link"))
+
+			walk_files = []
+			walk_dirs = []
+			for root, dirs, files in os.walk(top):
+				walk_files.extend(os.path.join(root, name) for name in files)
+				walk_dirs.extend(os.path.join(root, name) for name in dirs)
+
+			# compare real paths since links may or may not be resolved
+			real_paths = lambda paths: [os.path.realpath(path) for path in paths]
+			self.assertEqual(real_paths(py_common.find_files_in_dir(top, ".*")), real_paths(walk_files))
+			self.assertEqual(real_paths(py_common.find_directories_in_dir(top, ".*")), real_paths(walk_dirs))
+		finally:
+			shutil.rmtree(top)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -16,9 +16,7 @@ def build_list_of_java_testcase_files(directory):
 	files_to_check = []
 	for root, dirs, files in os.walk(directory):
 		for name in files:
-			result = re.search(py_common.get_primary_testcase_filename_regex(), name, re.IGNORECASE)
-
-			if result != None:
+			if py_common.is_primary_testcase_file(name):
 				files_to_check.append(os.path.realpath(os.path.join(root,name)))
 
 		# don't enumerate files in support directories